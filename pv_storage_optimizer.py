@@ -1,8 +1,8 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import plotly.express as px
+import plotly.graph_objects as go
+from numba import njit, prange
 
 # 页面配置
 st.set_page_config(
@@ -27,6 +27,15 @@ PV_COMPONENTS = {
     "自定义组件": {"efficiency": 20.0, "price_per_w": 2.0}
 }
 
+
+# 组件参数表只构建一次, 跨会话复用
+@st.cache_resource
+def _pv_component_df():
+    return pd.DataFrame.from_dict(PV_COMPONENTS, orient='index')
+
+
+PV_DF = _pv_component_df()
+
 # 侧边栏 - 用户输入
 with st.sidebar:
     st.header("系统参数设置")
@@ -65,18 +74,15 @@ with st.sidebar:
     subsidy = st.number_input("政府补贴 (元/kWh)", min_value=0.0, max_value=1.0, value=0.3)
     feed_in_tariff = st.number_input("上网电价 (元/kWh)", min_value=0.0, max_value=1.0, value=0.2)
 
-# 获取组件参数
-pv_params = PV_COMPONENTS[pv_component]
-pv_power_kw = pv_power_per_panel / 1000  # 转换为kW
-
-
 # 计算系统参数
-def calculate_system():
+@st.cache_data(max_entries=32)
+def calculate_system(pv_power_kw, pv_count, pv_efficiency, sunshine_hours,
+                     system_loss, battery_capacity, dod_limit, inverter_power):
     # 光伏系统总容量
     pv_total_power = pv_power_kw * pv_count  # kW
 
     # 日均发电量
-    daily_generation = pv_total_power * sunshine_hours * (pv_params["efficiency"] / 100) * (1 - system_loss / 100)
+    daily_generation = pv_total_power * sunshine_hours * (pv_efficiency / 100) * (1 - system_loss / 100)
 
     # 储能系统可用容量
     usable_capacity = battery_capacity * (dod_limit / 100)
@@ -90,74 +96,111 @@ def calculate_system():
     }
 
 
-# 能量流模拟
-def simulate_energy_flow(system_params):
-    # 日均用电量
-    daily_usage = monthly_usage / 30
+# 发电包络 (6:00-18:00的半正弦形状固定, 只随日发电量缩放, 导入时算好)
+_SIN_ENVELOPE = 0.5 * np.sin(np.linspace(0.0, np.pi, 13))
 
-    # 高峰时段用电量
-    peak_usage_kwh = daily_usage * peak_usage / 100
+# 早晚用电高峰时段掩码 (7:00-10:00与18:00-22:00), 与用户输入无关
+_PEAK_MASK = np.zeros(24, dtype=bool)
+_PEAK_MASK[7:11] = True
+_PEAK_MASK[18:23] = True
 
-    # 模拟一天24小时的能量流动
-    hours = 24
-    time = list(range(hours))
 
-    # 发电曲线 (正弦曲线模拟)
-    generation = [0] * hours
-    for h in range(6, 19):  # 6:00-18:00有光照
-        # 正弦曲线模拟发电量变化
-        normalized_hour = (h - 6) / 12
-        generation[h] = system_params["日均发电量(kWh)"] * np.sin(normalized_hour * np.pi) * 0.5
+# 逐时调度内核 (Numba编译, cache=True避免每次启动重新编译)
+@njit(cache=True)
+def _dispatch(generation, consumption, usable_capacity, efficiency):
+    hours = generation.size
+    # 每个小时都会写满全部输出, 因此np.empty即可, 省去清零
+    # kWh量级下float32精度足够, 且序列化到前端的数据量减半
+    battery_soc = np.empty(hours, dtype=np.float32)  # 电池电量
+    grid_import = np.empty(hours, dtype=np.float32)  # 从电网购电
+    grid_export = np.empty(hours, dtype=np.float32)  # 向电网售电
+    battery_charge = np.empty(hours, dtype=np.float32)  # 电池充电
+    battery_discharge = np.empty(hours, dtype=np.float32)  # 电池放电
 
-    # 用电曲线 (双峰曲线)
-    consumption = [0] * hours
-    for h in range(hours):
-        # 基础用电 + 高峰时段增加
-        base_load = daily_usage / hours
-        if 7 <= h <= 10 or 18 <= h <= 22:  # 早晚高峰
-            consumption[h] = base_load * 1.8
-        else:
-            consumption[h] = base_load
-
-    # 电池状态
-    battery_soc = [0] * hours  # 电池电量
-    grid_import = [0] * hours  # 从电网购电
-    grid_export = [0] * hours  # 向电网售电
-    battery_charge = [0] * hours  # 电池充电
-    battery_discharge = [0] * hours  # 电池放电
-
-    current_soc = 0  # 初始电量为0
-    usable_capacity = system_params["可用容量(kWh)"]
+    current_soc = 0.0  # 初始电量为0
 
     for h in range(hours):
         # 计算净发电量
         net_generation = generation[h] - consumption[h]
 
-        if net_generation > 0:  # 发电量大于用电量
-            # 多余电量先给电池充电
-            max_charge = min(net_generation, (usable_capacity - current_soc) / (battery_efficiency / 100))
-            battery_charge[h] = max_charge
-            current_soc += max_charge * (battery_efficiency / 100)
-
-            # 如果还有多余电量，卖给电网
-            remaining = net_generation - max_charge
-            if remaining > 0:
-                grid_export[h] = remaining
-        else:  # 用电量大于发电量
-            deficit = -net_generation
-
-            # 先用电池放电
-            max_discharge = min(deficit, current_soc * (battery_efficiency / 100))
-            battery_discharge[h] = max_discharge
-            current_soc -= max_discharge / (battery_efficiency / 100)
-
-            # 如果还有不足，从电网购电
-            remaining_deficit = deficit - max_discharge
-            if remaining_deficit > 0:
-                grid_import[h] = remaining_deficit
+        # 无分支的充放电裁剪: 盈余先充电、余量售电, 亏空先放电、余量购电
+        # (min/max编译为标量minsd/maxsd指令, 避免分支预测失败)
+        charge = max(0.0, min(net_generation, (usable_capacity - current_soc) / efficiency))
+        discharge = max(0.0, min(-net_generation, current_soc * efficiency))
+
+        battery_charge[h] = charge
+        battery_discharge[h] = discharge
+        current_soc += charge * efficiency - discharge / efficiency
+
+        grid_export[h] = max(0.0, net_generation - charge)
+        grid_import[h] = max(0.0, -net_generation - discharge)
 
         battery_soc[h] = current_soc
 
+    return battery_soc, grid_import, grid_export, battery_charge, battery_discharge
+
+
+# 组件数量扫描内核: 各配置相互独立, prange多线程并行调度
+@njit(parallel=True, cache=True)
+def _sweep_payback(pv_counts, pv_power_kw, pv_efficiency, sunshine_hours, system_loss,
+                   usable_capacity, efficiency, consumption, pv_power_per_panel,
+                   pv_price_per_w, battery_investment, inverter_investment,
+                   annual_consumption, electricity_price, subsidy, feed_in_tariff):
+    n = pv_counts.size
+    payback = np.empty(n, dtype=np.float64)
+    for i in prange(n):
+        daily_generation = (pv_power_kw * pv_counts[i] * sunshine_hours
+                            * (pv_efficiency / 100) * (1 - system_loss / 100))
+        generation = np.zeros(24, dtype=np.float32)
+        for h in range(13):
+            generation[6 + h] = daily_generation * _SIN_ENVELOPE[h]
+
+        _, grid_import, grid_export, _, _ = _dispatch(generation, consumption,
+                                                      usable_capacity, efficiency)
+
+        annual_grid_import = grid_import.sum() * 365
+        annual_grid_export = grid_export.sum() * 365
+        total_investment = (pv_counts[i] * pv_power_per_panel * pv_price_per_w
+                            + battery_investment + inverter_investment)
+        annual_benefit = ((annual_consumption - annual_grid_import) * electricity_price
+                          + annual_grid_export * feed_in_tariff
+                          + daily_generation * 365 * subsidy)
+        payback[i] = total_investment / annual_benefit if annual_benefit > 0 else np.inf
+    return payback
+
+
+# 用电概况: 日均用电量与高峰时段用电量 (多个函数共用)
+@st.cache_data(max_entries=32)
+def _usage_profile(monthly_usage, peak_usage):
+    daily_usage = monthly_usage / 30
+    peak_usage_kwh = daily_usage * peak_usage / 100
+    return daily_usage, peak_usage_kwh
+
+
+# 能量流模拟
+@st.cache_data(max_entries=32)
+def simulate_energy_flow(system_params, daily_usage, battery_efficiency):
+    # 字典取值提前转为局部float标量, 内核只接触数值
+    daily_generation = float(system_params["日均发电量(kWh)"])
+    usable_capacity = float(system_params["可用容量(kWh)"])
+
+    # 模拟一天24小时的能量流动
+    hours = 24
+    time = np.arange(hours)
+
+    # 发电曲线 (正弦曲线模拟, 6:00-18:00有光照)
+    generation = np.zeros(hours, dtype=np.float32)
+    generation[6:19] = daily_generation * _SIN_ENVELOPE
+
+    # 用电曲线 (双峰曲线): 基础用电 + 早晚高峰增加
+    base_load = daily_usage / hours
+    consumption = np.full(hours, base_load, dtype=np.float32)
+    consumption[_PEAK_MASK] *= 1.8
+
+    # 电池逐时调度 (编译内核只接收数组和标量)
+    battery_soc, grid_import, grid_export, battery_charge, battery_discharge = _dispatch(
+        generation, consumption, usable_capacity, battery_efficiency / 100)
+
     return {
         "时间": time,
         "发电量": generation,
@@ -170,10 +213,19 @@ def simulate_energy_flow(system_params):
     }
 
 
+# 经济性分析结果标签 (与下方取整后的数值顺序一一对应)
+_ECON_LABELS = ("光伏投资(元)", "储能投资(元)", "逆变器投资(元)", "总投资(元)",
+                "年发电量(kWh)", "年自用电量(kWh)", "年购电量(kWh)", "年售电量(kWh)",
+                "年总收益(元)")
+
+
 # 经济性分析
-def economic_analysis(system_params, energy_flow):
+@st.cache_data(max_entries=32)
+def economic_analysis(system_params, energy_flow, monthly_usage, pv_count,
+                      pv_power_per_panel, pv_price_per_w, battery_capacity,
+                      inverter_price, electricity_price, subsidy, feed_in_tariff):
     # 初始投资
-    pv_investment = pv_count * pv_power_per_panel * pv_params["price_per_w"]
+    pv_investment = pv_count * pv_power_per_panel * pv_price_per_w
     battery_investment = battery_capacity * 1000  # 假设每kWh成本1000元
     inverter_investment = inverter_price
     total_investment = pv_investment + battery_investment + inverter_investment
@@ -184,11 +236,11 @@ def economic_analysis(system_params, energy_flow):
     # 年用电量
     annual_consumption = monthly_usage * 12
 
-    # 年电网购电量
-    annual_grid_import = sum(energy_flow["电网购电"]) * 365 / 24
+    # 年电网购电量 (24小时序列之和即日购电量)
+    annual_grid_import = energy_flow["电网购电"].sum() * 365
 
     # 年电网售电量
-    annual_grid_export = sum(energy_flow["电网售电"]) * 365 / 24
+    annual_grid_export = energy_flow["电网售电"].sum() * 365
 
     # 年收益计算
     # 节省电费 = (总用电量 - 电网购电量) * 电价
@@ -205,28 +257,20 @@ def economic_analysis(system_params, energy_flow):
     # 简单投资回收期
     payback_years = total_investment / total_annual_benefit if total_annual_benefit > 0 else float('inf')
 
-    return {
-        "光伏投资(元)": round(pv_investment),
-        "储能投资(元)": round(battery_investment),
-        "逆变器投资(元)": round(inverter_investment),
-        "总投资(元)": round(total_investment),
-        "年发电量(kWh)": round(annual_generation),
-        "年自用电量(kWh)": round(annual_consumption - annual_grid_import),
-        "年购电量(kWh)": round(annual_grid_import),
-        "年售电量(kWh)": round(annual_grid_export),
-        "年总收益(元)": round(total_annual_benefit),
-        "投资回收期(年)": round(payback_years, 1) if payback_years != float('inf') else ">50年"
-    }
+    # 数值一次性向量化取整, 回收期单独处理 (需要">50年"回退)
+    values = np.round(np.array([
+        pv_investment, battery_investment, inverter_investment, total_investment,
+        annual_generation, annual_consumption - annual_grid_import,
+        annual_grid_import, annual_grid_export, total_annual_benefit
+    ])).astype(np.int64)
 
+    economics = dict(zip(_ECON_LABELS, values.tolist()))
+    economics["投资回收期(年)"] = round(payback_years, 1) if payback_years != float('inf') else ">50年"
+    return economics
 
-# 计算备用供电能力
-def calculate_backup_capacity(system_params):
-    # 日均用电量
-    daily_usage = monthly_usage / 30
-
-    # 高峰时段用电量
-    peak_usage_kwh = daily_usage * peak_usage / 100
 
+# 计算备用供电能力
+def calculate_backup_capacity(system_params, peak_usage_kwh, backup_hours):
     # 可用储能容量
     usable_capacity = system_params["可用容量(kWh)"]
 
@@ -236,11 +280,114 @@ def calculate_backup_capacity(system_params):
     return backup_capacity_hours
 
 
+# 堆叠面积图构建 (直接用go.Figure, 跳过px的宽表melt; 按数组内容缓存)
+@st.cache_data(max_entries=32)
+def _build_flow_fig(series, columns, title):
+    hours = np.arange(series.shape[0])
+    fig = go.Figure()
+    for i, name in enumerate(columns):
+        fig.add_scatter(x=hours, y=series[:, i], stackgroup='one', name=name)
+    fig.update_layout(title=title)
+    return fig
+
+
+# 经济性分析结果表 (纯展示层转换, 按键值对缓存)
+@st.cache_data(max_entries=32)
+def _econ_df(items):
+    return pd.DataFrame(list(items), columns=["指标", "数值"]).set_index("指标")
+
+
+# 敏感性分析: 扫描光伏组件数量, 计算各配置的投资回收期
+@st.cache_data(max_entries=32)
+def sweep_pv_count_payback(max_count, pv_power_kw, pv_efficiency, sunshine_hours,
+                           system_loss, usable_capacity, battery_efficiency, daily_usage,
+                           pv_power_per_panel, pv_price_per_w, battery_investment,
+                           inverter_investment, annual_consumption, electricity_price,
+                           subsidy, feed_in_tariff):
+    pv_counts = np.arange(1, max_count + 1, dtype=np.float64)
+
+    # 用电曲线与simulate_energy_flow一致 (双峰曲线)
+    consumption = np.full(24, daily_usage / 24, dtype=np.float32)
+    consumption[_PEAK_MASK] *= 1.8
+
+    return _sweep_payback(pv_counts, pv_power_kw, pv_efficiency, sunshine_hours,
+                          system_loss, usable_capacity, battery_efficiency / 100,
+                          consumption, pv_power_per_panel, pv_price_per_w,
+                          battery_investment, inverter_investment, annual_consumption,
+                          electricity_price, subsidy, feed_in_tariff)
+
+
+# 静态内容只构建一次, 避免每次重跑重新序列化
+@st.cache_resource
+def _deploy_notes():
+    return """
+1. 将本代码保存为 `pv_storage_optimizer.py`
+2. 上传到GitHub仓库
+3. 登录[Streamlit Sharing](https://share.streamlit.io/)
+4. 选择仓库和文件进行部署
+"""
+
+
+@st.cache_resource
+def _page_css():
+    return """
+<style>
+    .stMetric {
+        background-color: #f0f2f6;
+        border-radius: 10px;
+        padding: 15px;
+        margin-bottom: 10px;
+    }
+    .stMetric label {
+        font-size: 1rem;
+        color: #666;
+    }
+    .stMetric div {
+        font-size: 1.5rem;
+        font-weight: bold;
+        color: #333;
+    }
+    .css-1v0mbdj {
+        border-radius: 10px;
+        overflow: hidden;
+    }
+    .stDataFrame {
+        border-radius: 10px;
+    }
+</style>
+"""
+
+
+# 主计算入口: 输入打包成单个元组, 一次哈希检查即可跳过全部计算
+# (仅影响显示的控件如逆变器效率不参与键值)
+@st.cache_data(max_entries=32)
+def run_all(inputs):
+    (monthly_usage, peak_usage, backup_hours, sunshine_hours, system_loss,
+     pv_component, pv_power_per_panel, pv_count, battery_capacity,
+     battery_efficiency, dod_limit, inverter_power, inverter_price,
+     electricity_price, subsidy, feed_in_tariff) = inputs
+
+    pv_efficiency = PV_DF.at[pv_component, "efficiency"]
+    pv_price_per_w = PV_DF.at[pv_component, "price_per_w"]
+    pv_power_kw = pv_power_per_panel / 1000  # 转换为kW
+
+    system_params = calculate_system(pv_power_kw, pv_count, pv_efficiency, sunshine_hours,
+                                     system_loss, battery_capacity, dod_limit, inverter_power)
+    daily_usage, peak_usage_kwh = _usage_profile(monthly_usage, peak_usage)
+    energy_flow = simulate_energy_flow(system_params, daily_usage, battery_efficiency)
+    economics = economic_analysis(system_params, energy_flow, monthly_usage, pv_count,
+                                  pv_power_per_panel, pv_price_per_w, battery_capacity,
+                                  inverter_price, electricity_price, subsidy, feed_in_tariff)
+    backup_capacity = calculate_backup_capacity(system_params, peak_usage_kwh, backup_hours)
+    return system_params, energy_flow, economics, backup_capacity
+
+
 # 主计算逻辑
-system_params = calculate_system()
-energy_flow = simulate_energy_flow(system_params)
-economics = economic_analysis(system_params, energy_flow)
-backup_capacity = calculate_backup_capacity(system_params)
+inputs = (monthly_usage, peak_usage, backup_hours, sunshine_hours, system_loss,
+          pv_component, pv_power_per_panel, pv_count, battery_capacity,
+          battery_efficiency, dod_limit, inverter_power, inverter_price,
+          electricity_price, subsidy, feed_in_tariff)
+system_params, energy_flow, economics, backup_capacity = run_all(inputs)
 
 # 结果显示
 st.subheader("系统配置概览")
@@ -262,70 +409,65 @@ with col3:
 
 # 经济性分析
 st.subheader("经济性分析")
-econ_df = pd.DataFrame.from_dict(economics, orient='index', columns=['数值'])
-st.dataframe(econ_df, use_container_width=True)
+st.dataframe(_econ_df(tuple(economics.items())), use_container_width=True)
 
 # 能量流可视化
 st.subheader("24小时能量流模拟")
-df_energy = pd.DataFrame({
-    "时间": energy_flow["时间"],
-    "发电量(kWh)": energy_flow["发电量"],
-    "用电量(kWh)": energy_flow["用电量"],
-    "电池电量(kWh)": energy_flow["电池电量"],
-    "电网购电(kWh)": energy_flow["电网购电"],
-    "电网售电(kWh)": energy_flow["电网售电"],
-    "电池充电(kWh)": energy_flow["电池充电"],
-    "电池放电(kWh)": energy_flow["电池放电"]
-})
 
 # 创建堆叠面积图展示能量流
-fig_energy = px.area(df_energy, x="时间", y=["发电量(kWh)", "用电量(kWh)", "电网购电(kWh)", "电网售电(kWh)"],
-                     title="24小时能量流动模拟")
+fig_energy = _build_flow_fig(
+    np.column_stack([energy_flow["发电量"], energy_flow["用电量"],
+                     energy_flow["电网购电"], energy_flow["电网售电"]]),
+    ("发电量(kWh)", "用电量(kWh)", "电网购电(kWh)", "电网售电(kWh)"),
+    "24小时能量流动模拟")
 st.plotly_chart(fig_energy, use_container_width=True)
 
 # 电池状态可视化
-fig_battery = px.area(df_energy, x="时间", y=["电池电量(kWh)"],
-                      title="电池充放电状态")
+fig_battery = _build_flow_fig(
+    np.column_stack([energy_flow["电池电量"]]),
+    ("电池电量(kWh)",),
+    "电池充放电状态")
 st.plotly_chart(fig_battery, use_container_width=True)
 
+# 逐时数据表 (dict-of-ndarray一次构建, copy=False让pandas直接引用float32数组)
+with st.expander("查看逐时模拟数据"):
+    df_energy = pd.DataFrame({
+        "时间": energy_flow["时间"],
+        "发电量(kWh)": energy_flow["发电量"],
+        "用电量(kWh)": energy_flow["用电量"],
+        "电池电量(kWh)": energy_flow["电池电量"],
+        "电网购电(kWh)": energy_flow["电网购电"],
+        "电网售电(kWh)": energy_flow["电网售电"],
+        "电池充电(kWh)": energy_flow["电池充电"],
+        "电池放电(kWh)": energy_flow["电池放电"]
+    }, copy=False)
+    st.dataframe(df_energy, use_container_width=True)
+
+# 敏感性分析 (按需计算)
+st.subheader("敏感性分析")
+if st.checkbox("展示敏感性分析 (扫描光伏组件数量 1-100)"):
+    daily_usage, _ = _usage_profile(monthly_usage, peak_usage)
+    payback_curve = sweep_pv_count_payback(
+        100, pv_power_per_panel / 1000, PV_DF.at[pv_component, "efficiency"],
+        sunshine_hours, system_loss, system_params["可用容量(kWh)"],
+        battery_efficiency, daily_usage, pv_power_per_panel,
+        PV_DF.at[pv_component, "price_per_w"], battery_capacity * 1000,
+        inverter_price, monthly_usage * 12, electricity_price, subsidy, feed_in_tariff)
+
+    fig_sweep = go.Figure()
+    fig_sweep.add_scatter(x=np.arange(1, payback_curve.size + 1), y=payback_curve,
+                          name="投资回收期(年)")
+    fig_sweep.update_layout(title="不同光伏组件数量下的投资回收期",
+                            xaxis_title="光伏组件数量", yaxis_title="投资回收期(年)")
+    st.plotly_chart(fig_sweep, use_container_width=True)
+
 # 组件参数参考
 st.subheader("光伏组件参数参考")
-pv_df = pd.DataFrame.from_dict(PV_COMPONENTS, orient='index')
-st.dataframe(pv_df, use_container_width=True)
+st.dataframe(PV_DF, use_container_width=True)
 
 # 部署说明
 st.subheader("部署到Streamlit Sharing")
-st.markdown("""
-1. 将本代码保存为 `pv_storage_optimizer.py`
-2. 上传到GitHub仓库
-3. 登录[Streamlit Sharing](https://share.streamlit.io/)
-4. 选择仓库和文件进行部署
-""")
+st.markdown(_deploy_notes())
 
 # 添加样式
-st.markdown("""
-<style>
-    .stMetric {
-        background-color: #f0f2f6;
-        border-radius: 10px;
-        padding: 15px;
-        margin-bottom: 10px;
-    }
-    .stMetric label {
-        font-size: 1rem;
-        color: #666;
-    }
-    .stMetric div {
-        font-size: 1.5rem;
-        font-weight: bold;
-        color: #333;
-    }
-    .css-1v0mbdj {
-        border-radius: 10px;
-        overflow: hidden;
-    }
-    .stDataFrame {
-        border-radius: 10px;
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(_page_css(), unsafe_allow_html=True)